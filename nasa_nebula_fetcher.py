@@ -1,14 +1,45 @@
+import argparse
+import os
 import requests
-from PIL import Image
-from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import shutil
 import re
 import datetime
-import pyneb as pn
-from astroquery.simbad import Simbad
-from astroquery.vizier import Vizier
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+
+# pyneb, astroquery/astropy e PIL são importados dentro das funções que os usam:
+# são pesados e só fazem falta depois que o usuário escolhe uma nebulosa
+
+# Cache em disco das respostas do SIMBAD/VizieR (o astroquery indexa pela URL da consulta);
+# o diretório é criado sob demanda em _configurar_cache e as respostas expiram após um dia
+CACHE_DIR = Path("~/.cache/nebula").expanduser()
+CACHE_EXPIRACAO = 86400
+
+# Sessão HTTP compartilhada: reaproveita conexões keep-alive com a API e os assets da NASA
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"])
+    )
+))
+
+# Limite de downloads simultâneos, abaixo do pool_maxsize do adaptador para não descartar conexões
+MAX_DOWNLOADS_PARALELOS = 8
+
+# (conexão, leitura) em segundos: um servidor travado não segura o script indefinidamente
+HTTP_TIMEOUT = (3, 15)
 
 # Catálogo de nebulosas populares
-CATALOGO_NEBULOSAS = {
+CATALOGO_NEBULOSAS = MappingProxyType({
     1: "Helix Nebula",
     2: "Cat's Eye Nebula",
     3: "Ring Nebula",
@@ -19,39 +50,73 @@ CATALOGO_NEBULOSAS = {
     8: "NGC 6543",
     9: "IC 418",
     10: "NGC 3242"
-}
+})
 
-MAPEAMENTO_SIMBAD = {
+MAPEAMENTO_SIMBAD = MappingProxyType({
     "Cat's Eye Nebula": "NGC 6543",
     "Ring Nebula": "NGC 6720",
     "Eskimo Nebula": "NGC 2392",
     "Helix Nebula": "NGC 7293",
     "Dumbbell Nebula": "NGC 6853",
     "Saturn Nebula": "NGC 7009"
-}
+})
 
-DADOS_FIXOS = {
-    "NGC 6543": {"ra": "17 58 33.4", "dec": "+66 37 59", "dist_pc": 1001, "dist_ly": 3266.5},
-    "NGC 6720": {"ra": "18 53 35.1", "dec": "+33 01 45", "dist_pc": 720, "dist_ly": 2350.3},
-    "NGC 2392": {"ra": "07 29 10.8", "dec": "+20 54 42", "dist_pc": 870, "dist_ly": 2837.6}
-}
+DADOS_FIXOS = MappingProxyType({
+    "NGC 6543": MappingProxyType({"ra": "17 58 33.4", "dec": "+66 37 59", "dist_pc": 1001, "dist_ly": 3266.5}),
+    "NGC 6720": MappingProxyType({"ra": "18 53 35.1", "dec": "+33 01 45", "dist_pc": 720, "dist_ly": 2350.3}),
+    "NGC 2392": MappingProxyType({"ra": "07 29 10.8", "dec": "+20 54 42", "dist_pc": 870, "dist_ly": 2837.6})
+})
 
-COMPOSICAO_GENERICA = [
+COMPOSICAO_GENERICA = (
     ("Hidrogênio (Hα)", "656.3 nm", "vermelho"),
     ("Oxigênio duplamente ionizado [O III]", "495.9 nm e 500.7 nm", "verde-brilhante"),
     ("Hélio II", "468.6 nm", "azulado"),
     ("Nitrogênio ionizado [N II]", "658.4 nm", "vermelho-alaranjado")
-]
+)
+
+# Caracteres inválidos em nomes de arquivo (e espaços), trocados por "_" numa única passada
+_INVALID_CHARS = re.compile(r'[\\/*?:"<>| ]')
 
 def limpar_nome_arquivo(texto):
-    return re.sub(r'[\\/*?:"<>|]', "_", texto.replace(" ", "_"))
+    return _INVALID_CHARS.sub("_", texto)
+
+def _configurar_cache(servico):
+    # Chamado dentro do try de quem consulta: $HOME sem permissão de escrita só cai no fallback
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        from astroquery import cache_conf
+    except ImportError:
+        # Versões antigas do astroquery não têm expiração configurável; mantém o padrão
+        pass
+    else:
+        cache_conf.cache_timeout = CACHE_EXPIRACAO
+    servico.cache_location = CACHE_DIR
+
+# Importa e configura SIMBAD/VizieR uma única vez por execução
+# (add_votable_fields acumula os campos a cada chamada)
+@lru_cache(maxsize=1)
+def _simbad():
+    from astroquery.simbad import Simbad
+
+    _configurar_cache(Simbad)
+    Simbad.TIMEOUT = 10
+    Simbad.add_votable_fields("coordinates", "mesdistance")
+    return Simbad
+
+@lru_cache(maxsize=1)
+def _vizier():
+    from astroquery.vizier import Vizier
+
+    vizier = Vizier(columns=["*"], column_filters={})
+    vizier.ROW_LIMIT = 50
+    _configurar_cache(vizier)
+    vizier.TIMEOUT = HTTP_TIMEOUT[1]
+    return vizier
 
 def buscar_dados_simbad(nome_objeto):
     nome_query = MAPEAMENTO_SIMBAD.get(nome_objeto, nome_objeto)
     try:
-        Simbad.TIMEOUT = 10
-        Simbad.add_votable_fields("coordinates", "mesdistance")
-        result = Simbad.query_object(nome_query)
+        result = _simbad().query_object(nome_query)
         if result and "RA" in result.colnames and "DEC" in result.colnames:
             ra = result["RA"][0]
             dec = result["DEC"][0]
@@ -65,21 +130,30 @@ def buscar_dados_simbad(nome_objeto):
         return DADOS_FIXOS[nome_query]
     return None
 
-def buscar_composicao_quimica(nome_query):
-    vizier = Vizier(columns=["*"], column_filters={})
-    vizier.ROW_LIMIT = 50
-    try:
+def buscar_composicao_quimica(nome_query, dados_astro=None):
+    # Roda em segundo plano: não imprime nada e deixa as exceções para main mostrar
+    vizier = _vizier()
+    if dados_astro:
+        from astropy.coordinates import SkyCoord
+        import astropy.units as u
+
+        # Reaproveita as coordenadas já resolvidas pelo SIMBAD em vez de resolver o nome de novo
+        coord = SkyCoord(dados_astro["ra"], dados_astro["dec"], unit=(u.hourangle, u.deg))
+        resultado = vizier.query_region(coord, radius=10 * u.arcsec)
+    else:
         resultado = vizier.query_object(nome_query)
-        for tabela in resultado:
-            for coluna in tabela.colnames:
-                if "logOH" in coluna or "O_H" in coluna:
-                    val = tabela[coluna][0]
-                    return f"log(O/H) ≈ {val}"
-    except Exception as e:
-        print(f"⚠️ Erro ao consultar composição química em VizieR: {e}")
+    for tabela in resultado:
+        for coluna in tabela.colnames:
+            if "logOH" in coluna or "O_H" in coluna:
+                val = tabela[coluna][0]
+                return f"log(O/H) ≈ {val}"
     return None
 
+# Os fluxos são constantes, então o resultado é sempre o mesmo: calcula uma vez só (tratar como somente leitura)
+@lru_cache(maxsize=1)
 def calcular_condicoes_pyneb():
+    import pyneb as pn
+
     O3 = pn.Atom('O', 3)
     N2 = pn.Atom('N', 2)
     S2 = pn.Atom('S', 2)
@@ -106,88 +180,148 @@ def calcular_condicoes_pyneb():
         "Densidade Eletrônica [S II] (cm⁻³)": ne_S2
     }
 
-def salvar_info_em_txt(nome_nebulosa, dados_astro, imagens):
-    nome_id = MAPEAMENTO_SIMBAD.get(nome_nebulosa, nome_nebulosa)
+def salvar_info_em_txt(nome_nebulosa, dados_astro, imagens, composicao_real):
     arquivo_nome = f"{limpar_nome_arquivo(nome_nebulosa)}_info.txt"
-    composicao_real = buscar_composicao_quimica(nome_id)
     condicoes_pyneb = calcular_condicoes_pyneb()
 
-    with open(arquivo_nome, "w", encoding="utf-8") as f:
-        f.write(f"Nebulosa: {nome_nebulosa}\n")
-        if dados_astro:
-            f.write(f"Coordenadas: RA = {dados_astro['ra']}, DEC = {dados_astro['dec']}\n")
-            if dados_astro['dist_ly']:
-                f.write(f"Distância estimada: {dados_astro['dist_ly']:.1f} anos-luz ({dados_astro['dist_pc']} pc)\n")
-        else:
-            f.write("Dados astronômicos indisponíveis.\n")
+    parts = []
+    parts.append(f"Nebulosa: {nome_nebulosa}\n")
+    if dados_astro:
+        parts.append(f"Coordenadas: RA = {dados_astro['ra']}, DEC = {dados_astro['dec']}\n")
+        if dados_astro['dist_ly']:
+            parts.append(f"Distância estimada: {dados_astro['dist_ly']:.1f} anos-luz ({dados_astro['dist_pc']} pc)\n")
+    else:
+        parts.append("Dados astronômicos indisponíveis.\n")
 
-        f.write(f"Data: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("\nImagens baixadas:\n")
-        for img in imagens:
-            f.write(f"- {img}\n")
+    parts.append(f"Data: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    parts.append("\nImagens baixadas:\n")
+    parts.extend(f"- {img}\n" for img in imagens)
 
-        f.write("\nLegenda científica sugerida:\n")
-        if dados_astro and dados_astro['dist_ly']:
-            f.write(f"Imagem da {nome_nebulosa}, localizada a aproximadamente {dados_astro['dist_ly']:.0f} anos-luz. RA: {dados_astro['ra']} | DEC: {dados_astro['dec']}.\n")
-        else:
-            f.write(f"Imagem da {nome_nebulosa}. Dados incompletos.\n")
+    parts.append("\nLegenda científica sugerida:\n")
+    if dados_astro and dados_astro['dist_ly']:
+        parts.append(f"Imagem da {nome_nebulosa}, localizada a aproximadamente {dados_astro['dist_ly']:.0f} anos-luz. RA: {dados_astro['ra']} | DEC: {dados_astro['dec']}.\n")
+    else:
+        parts.append(f"Imagem da {nome_nebulosa}. Dados incompletos.\n")
 
-        f.write("\nComposição química estimada:\n")
-        if composicao_real:
-            f.write(f"- {composicao_real} (extraída via VizieR)\n")
-        else:
-            for elem, linha, cor in COMPOSICAO_GENERICA:
-                f.write(f"- {elem} ({linha}) - tonalidade: {cor}\n")
+    parts.append("\nComposição química estimada:\n")
+    if composicao_real:
+        parts.append(f"- {composicao_real} (extraída via VizieR)\n")
+    else:
+        parts.extend(f"- {elem} ({linha}) - tonalidade: {cor}\n" for elem, linha, cor in COMPOSICAO_GENERICA)
 
-        f.write("\nCondições Físicas Simuladas (PyNeb):\n")
-        for descricao, valor in condicoes_pyneb.items():
-            f.write(f"- {descricao}: {valor:.0f} K\n")
+    parts.append("\nCondições Físicas Simuladas (PyNeb):\n")
+    parts.extend(f"- {descricao}: {valor:.0f} K\n" for descricao, valor in condicoes_pyneb.items())
+
+    # Monta o conteúdo todo em memória e grava de uma vez (sem arquivo parcial se algo falhar no meio)
+    Path(arquivo_nome).write_text("".join(parts), encoding="utf-8")
 
     print(f"\n📝 Informações salvas em: {arquivo_nome}")
 
+def limpar_query_nasa(query):
+    return query.replace("'", "").strip()
+
 def search_nasa_images(query, max_results=10):
-    query = query.replace("'", "").strip()
-    print(f"\n🔭 Buscando imagens da NASA para: '{query}'")
+    # Não imprime nada (roda em paralelo ao SIMBAD): devolve (status HTTP, resultados) e main mostra o status
     url = "https://images-api.nasa.gov/search"
-    params = {"q": query, "media_type": "image"}
-
+    params = {"q": limpar_query_nasa(query), "media_type": "image"}
+
+    response = SESSION.get(url, params=params, timeout=HTTP_TIMEOUT)
+    if response.status_code != 200:
+        return response.status_code, []
+
+    items = response.json().get("collection", {}).get("items", [])[:max_results]
+    results = []
+    for item in items:
+        data_block = item["data"][0]
+        results.append({
+            "title": data_block.get("title", "Sem título"),
+            "description": data_block.get("description", "Sem descrição"),
+            "date_created": data_block.get("date_created", "Desconhecida"),
+            "image_url": item.get("links", [{}])[0].get("href", "")
+        })
+    return response.status_code, results
+
+def download_image(image_url, filename):
+    # Roda numa thread de download: não imprime nada, devolve None ou a mensagem de erro
+    # Grava num .part e só renomeia no fim: um download interrompido não deixa .jpg truncado
+    temporario = filename + ".part"
     try:
-        response = requests.get(url, params=params)
-        print(f"🔁 Status HTTP: {response.status_code}")
-        if response.status_code != 200:
-            return []
-
-        items = response.json().get("collection", {}).get("items", [])[:max_results]
-        results = []
-        for item in items:
-            data_block = item["data"][0]
-            results.append({
-                "title": data_block.get("title", "Sem título"),
-                "description": data_block.get("description", "Sem descrição"),
-                "date_created": data_block.get("date_created", "Desconhecida"),
-                "image_url": item.get("links", [{}])[0].get("href", "")
-            })
-        return results
-
+        # Copia os bytes do JPEG direto para o disco, sem decodificar/recodificar com o PIL
+        with SESSION.get(image_url, stream=True, timeout=HTTP_TIMEOUT) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(temporario, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=65536)
+        os.replace(temporario, filename)
+        return None
     except Exception as e:
-        print(f"⚠️ Erro ao buscar imagens: {e}")
+        try:
+            os.remove(temporario)
+        except OSError:
+            pass
+        return str(e)
+
+def download_images(downloads, show=False):
+    # Downloads em paralelo; a exibição (opcional) fica na thread principal, após todos terminarem
+    # Retorna só os arquivos baixados com sucesso
+    if not downloads:
         return []
-
-def download_and_show_image(image_url, filename):
-    print(f"⬇️ Baixando imagem: {filename}")
-    try:
-        img = Image.open(BytesIO(requests.get(image_url).content))
-        img.save(filename)
-        print(f"💾 Imagem salva como: {filename}")
-        img.show()
-    except Exception as e:
-        print(f"⚠️ Erro ao baixar/abrir imagem: {e}")
+    for _, filename in downloads:
+        print(f"⬇️ Baixando imagem: {filename}")
+    with ThreadPoolExecutor(max_workers=min(len(downloads), MAX_DOWNLOADS_PARALELOS)) as executor:
+        erros = list(executor.map(lambda d: download_image(*d), downloads))
+
+    salvos = []
+    for (_, filename), erro in zip(downloads, erros):
+        if erro:
+            print(f"⚠️ Erro ao baixar imagem {filename}: {erro}")
+        else:
+            print(f"💾 Imagem salva como: {filename}")
+            salvos.append(filename)
+    if not show:
+        return salvos
+
+    from PIL import Image
+    for filename in salvos:
+        try:
+            Image.open(filename).show()
+        except Exception as e:
+            print(f"⚠️ Erro ao abrir imagem: {e}")
+    return salvos
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Busca imagens e dados de nebulosas (NASA + SIMBAD + VizieR + PyNeb).")
+    parser.add_argument(
+        "--show",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="abre cada imagem baixada no visualizador do sistema (padrão: --no-show)"
+    )
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     print("🚀 Busca interativa por nebulosas (NASA + SIMBAD + VizieR + PyNeb)")
     query = escolher_nebulosa()
-    dados = buscar_dados_simbad(query)
-    imagens_baixadas = []
+
+    # SIMBAD/VizieR e a API da NASA são servidores independentes: consulta os dois em paralelo.
+    # O VizieR vem logo depois do SIMBAD (reaproveita as coordenadas) e segue em segundo plano
+    # enquanto o usuário escolhe e baixa as imagens; o resultado só é lido na hora de salvar.
+    print(f"\n🔭 Buscando imagens da NASA para: '{limpar_query_nasa(query)}'")
+    nome_id = MAPEAMENTO_SIMBAD.get(query, query)
+    executor = ThreadPoolExecutor(max_workers=3)
+    f_simbad = executor.submit(buscar_dados_simbad, query)
+    f_nasa = executor.submit(search_nasa_images, query, 10)
+    f_vizier = executor.submit(lambda: buscar_composicao_quimica(nome_id, f_simbad.result()))
+    executor.shutdown(wait=False)
+
+    dados = f_simbad.result()
+    try:
+        status, images = f_nasa.result()
+        print(f"🔁 Status HTTP: {status}")
+    except Exception as e:
+        print(f"⚠️ Erro ao buscar imagens: {e}")
+        images = []
 
     if dados:
         print(f"\n📍 Coordenadas: RA = {dados['ra']}, DEC = {dados['dec']}")
@@ -198,7 +332,6 @@ def main():
     else:
         print("⚠️ Dados astronômicos não encontrados.")
 
-    images = search_nasa_images(query, max_results=10)
     if not images:
         print("❌ Nenhuma imagem encontrada.")
         return
@@ -213,17 +346,25 @@ def main():
     selections = input("\nDigite os números das imagens para baixar (ex: 1 3 5): ")
     numeros_escolhidos = [int(n)-1 for n in selections.split() if n.isdigit()]
 
+    # Indexado pelo nome do arquivo: duas threads nunca escrevem no mesmo arquivo
+    downloads = {}
     for idx in numeros_escolhidos:
         if 0 <= idx < len(images):
             item = images[idx]
             data_formatada = item['date_created'].split("T")[0] if "T" in item['date_created'] else "data_desconhecida"
             nome_arquivo = f"{limpar_nome_arquivo(item['title'])}_{data_formatada}.jpg"
-            download_and_show_image(item["image_url"], nome_arquivo)
-            imagens_baixadas.append(nome_arquivo)
+            downloads[nome_arquivo] = item["image_url"]
         else:
             print(f"⚠️ Índice inválido: {idx+1}")
 
-    salvar_info_em_txt(query, dados, imagens_baixadas)
+    imagens_baixadas = download_images([(url, nome) for nome, url in downloads.items()], show=args.show)
+
+    try:
+        composicao_real = f_vizier.result()
+    except Exception as e:
+        print(f"⚠️ Erro ao consultar composição química em VizieR: {e}")
+        composicao_real = None
+    salvar_info_em_txt(query, dados, imagens_baixadas, composicao_real)
 
 def mostrar_catalogo():
     print("\n📚 Catálogo de nebulosas:")
@@ -233,16 +374,16 @@ def mostrar_catalogo():
 
 def escolher_nebulosa():
     mostrar_catalogo()
-    escolha = input("\nDigite o número da nebulosa desejada ou 0 para buscar manualmente: ")
-
-    if escolha.isdigit():
-        escolha = int(escolha)
-        if escolha == 0:
-            return input("Digite o nome da nebulosa: ").strip()
-        elif escolha in CATALOGO_NEBULOSAS:
-            return CATALOGO_NEBULOSAS[escolha]
-    print("❌ Opção inválida. Tente novamente.")
-    return escolher_nebulosa()
+    while True:
+        escolha = input("\nDigite o número da nebulosa desejada ou 0 para buscar manualmente: ")
+
+        if escolha.isdigit():
+            escolha = int(escolha)
+            if escolha == 0:
+                return input("Digite o nome da nebulosa: ").strip()
+            elif escolha in CATALOGO_NEBULOSAS:
+                return CATALOGO_NEBULOSAS[escolha]
+        print("❌ Opção inválida. Tente novamente.")
 
 if __name__ == "__main__":
     main()